@@ -3,14 +3,19 @@ Ephemeral Audio Decay System
 A Flask server that streams WAV files while progressively degrading them through listener interaction.
 """
 
+import fcntl
 import os
-from flask import Flask, Response, request, jsonify
+from flask import Flask, Response, request, jsonify, send_file
 from flask_cors import CORS
 from dotenv import load_dotenv
+from werkzeug.exceptions import RequestedRangeNotSatisfiable
+from werkzeug.wsgi import wrap_file
 
 # Load environment variables from .env file
 load_dotenv()
 
+from json_provider import OrjsonProvider
+from degradation_queue import DegradationQueue
 from metadata import MetadataManager
 from lock_manager import SegmentLockManager
 from streaming import AudioStreamingService
@@ -18,6 +23,7 @@ from streaming_readonly import stream_audio_readonly
 
 # Initialize Flask application
 app = Flask(__name__)
+app.json = OrjsonProvider(app)
 
 # Enable CORS for embedding in Eleventy site
 cors_origin = os.environ.get('CORS_ORIGIN', '*')
@@ -28,6 +34,11 @@ app.config['AUDIO_DIR'] = os.environ.get('AUDIO_DIR', './audio')
 app.config['METADATA_DIR'] = os.environ.get('METADATA_DIR', './metadata')
 app.config['SEGMENT_DURATION'] = float(os.environ.get('SEGMENT_DURATION', '0.5'))
 app.config['DEGRADATION_RATE'] = float(os.environ.get('DEGRADATION_RATE', '1.0'))
+app.config['DEGRADE_FLUSH_INTERVAL'] = float(os.environ.get('DEGRADE_FLUSH_INTERVAL', '0.25'))
+app.config['DEGRADE_BATCH_SIZE'] = int(os.environ.get('DEGRADE_BATCH_SIZE', '64'))
+
+# Read size used when the WSGI server falls back to iterating the file
+STREAM_BUFFER_SIZE = 64 * 1024
 
 # Ensure directories exist
 os.makedirs(app.config['AUDIO_DIR'], exist_ok=True)
@@ -40,7 +51,11 @@ metadata_manager = MetadataManager(
     app.config['SEGMENT_DURATION']
 )
 
-lock_manager = SegmentLockManager(timeout=5.0)
+# Lock files under the metadata dir make segment locks hold across gunicorn workers
+lock_manager = SegmentLockManager(
+    timeout=5.0,
+    lock_dir=os.path.join(app.config['METADATA_DIR'], 'locks')
+)
 
 streaming_service = AudioStreamingService(
     app.config['AUDIO_DIR'],
@@ -50,6 +65,15 @@ streaming_service = AudioStreamingService(
     app.config['DEGRADATION_RATE']
 )
 
+degradation_queue = DegradationQueue(
+    metadata_manager,
+    lock_manager,
+    app.config['SEGMENT_DURATION'],
+    app.config['DEGRADATION_RATE'],
+    app.config['DEGRADE_FLUSH_INTERVAL'],
+    app.config['DEGRADE_BATCH_SIZE']
+)
+
 
 def initialize_audio_system():
     """
@@ -60,28 +84,34 @@ def initialize_audio_system():
     print(f"Audio directory: {app.config['AUDIO_DIR']}")
     print(f"Metadata directory: {app.config['METADATA_DIR']}")
     
-    try:
-        # Scan audio directory and initialize metadata
-        initialized = metadata_manager.scan_and_initialize()
+    # Every gunicorn worker imports the app; serialize startup so only the
+    # first one initializes new tracks and the rest find them already done
+    init_lock_path = os.path.join(lock_manager.lock_dir, 'init.lock')
+    with open(init_lock_path, 'a') as init_lock:
+        fcntl.flock(init_lock, fcntl.LOCK_EX)
         
-        if initialized:
-            print(f"Initialized metadata for {len(initialized)} new track(s):")
-            for filename in initialized:
-                print(f"  - {filename}")
-        else:
-            print("No new tracks to initialize")
-        
-        # Get all tracks
-        tracks = metadata_manager.get_all_tracks()
-        print(f"\nTotal tracks available: {len(tracks)}")
+        try:
+            # Scan audio directory and initialize metadata
+            initialized = metadata_manager.scan_and_initialize()
+            
+            if initialized:
+                print(f"Initialized metadata for {len(initialized)} new track(s):")
+                for filename in initialized:
+                    print(f"  - {filename}")
+            else:
+                print("No new tracks to initialize")
+            
+            # Get all tracks
+            tracks = metadata_manager.get_all_tracks(app.config['DEGRADATION_RATE'])
+            print(f"\nTotal tracks available: {len(tracks)}")
+            
+            for track in tracks:
+                degradation = track.get('overall_degradation', 0)
+                print(f"  - {track['filename']} ({degradation:.1f}% degraded)")
         
-        for track in tracks:
-            degradation = track.get('overall_degradation', 0)
-            print(f"  - {track['filename']} ({degradation:.1f}% degraded)")
-    
-    except Exception as e:
-        print(f"Error during initialization: {e}")
-        print("System will continue, but some tracks may not be available")
+        except Exception as e:
+            print(f"Error during initialization: {e}")
+            print("System will continue, but some tracks may not be available")
 
 
 # Run initialization when app starts
@@ -104,7 +134,6 @@ def index():
 @app.route('/player')
 def player():
     """Serve the Tone.js player"""
-    from flask import send_file
     return send_file('examples/tone-player.html')
 
 
@@ -114,28 +143,29 @@ def get_tracks():
     Get list of all available tracks with degradation stats.
     
     Returns:
-        JSON array of track metadata
+        JSON array of track metadata, or 304 Not Modified if the client's
+        If-None-Match ETag is still current
     """
     try:
-        tracks = metadata_manager.get_all_tracks()
+        tracks = metadata_manager.get_all_tracks(app.config['DEGRADATION_RATE'])
         
         # Format response
         response = []
         for track in tracks:
-            # Calculate degradation with current rate
-            degradation = metadata_manager.get_overall_degradation(
-                track['filename'],
-                app.config['DEGRADATION_RATE']
-            )
             response.append({
                 'filename': track['filename'],
                 'title': track['title'],
                 'duration': track['duration'],
-                'overall_degradation': degradation,
+                'overall_degradation': track['overall_degradation'],
                 'total_streams': track.get('total_streams', 0)
             })
         
-        return jsonify(response)
+        # Content-hash ETag lets pollers revalidate with a bodiless 304
+        # until a play or stream changes the listing
+        result = jsonify(response)
+        result.add_etag()
+        result.headers['Cache-Control'] = 'no-cache'
+        return result.make_conditional(request)
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -153,73 +183,52 @@ def stream_audio(filename):
         Audio stream with range support
     """
     try:
-        file_path = os.path.join(app.config['AUDIO_DIR'], filename)
+        file_info = metadata_manager.get_file_info(filename)
         
-        if not os.path.exists(file_path):
+        if file_info is None:
             return jsonify({'error': 'Audio file not found'}), 404
         
         # Increment total streams (only on first request, not range requests)
         if 'Range' not in request.headers:
             metadata_manager.increment_total_streams(filename)
         
-        # Get file size
-        file_size = os.path.getsize(file_path)
+        file_size = file_info['size']
         
-        # Handle range requests for seeking
-        range_header = request.headers.get('Range')
-        if range_header:
-            # Parse range header (e.g., "bytes=0-1023")
-            byte_range = range_header.replace('bytes=', '').split('-')
-            start = int(byte_range[0]) if byte_range[0] else 0
-            end = int(byte_range[1]) if len(byte_range) > 1 and byte_range[1] else file_size - 1
-            
-            length = end - start + 1
-            
-            def generate():
-                with open(file_path, 'rb') as f:
-                    f.seek(start)
-                    remaining = length
-                    while remaining > 0:
-                        chunk_size = min(8192, remaining)
-                        chunk = f.read(chunk_size)
-                        if not chunk:
-                            break
-                        remaining -= len(chunk)
-                        yield chunk
-            
-            return Response(
-                generate(),
-                206,  # Partial Content
+        try:
+            audio_file = open(file_info['path'], 'rb')
+        except FileNotFoundError:
+            # Deleted between the index lookup and the open
+            metadata_manager.forget_file(filename)
+            return jsonify({'error': 'Audio file not found'}), 404
+        
+        # Once the response is returned the WSGI server owns (and closes) the
+        # file; until then, every error path must close it
+        try:
+            # Hand the open file to the WSGI server's file wrapper so full-file
+            # responses go out via sendfile() under gunicorn instead of a Python loop
+            response = Response(
+                wrap_file(request.environ, audio_file, buffer_size=STREAM_BUFFER_SIZE),
                 mimetype='audio/wav',
-                headers={
-                    'Content-Range': f'bytes {start}-{end}/{file_size}',
-                    'Accept-Ranges': 'bytes',
-                    'Content-Length': str(length),
-                    'Cache-Control': 'no-cache'
-                }
+                direct_passthrough=True
             )
-        else:
-            # Full file request
-            def generate():
-                with open(file_path, 'rb') as f:
-                    while True:
-                        chunk = f.read(8192)
-                        if not chunk:
-                            break
-                        yield chunk
+            response.content_length = file_size
+            response.headers['Cache-Control'] = 'no-cache'
             
-            return Response(
-                generate(),
-                mimetype='audio/wav',
-                headers={
-                    'Content-Length': str(file_size),
-                    'Accept-Ranges': 'bytes',
-                    'Cache-Control': 'no-cache'
-                }
+            # Handle range requests for seeking (206 Partial Content)
+            return response.make_conditional(
+                request,
+                accept_ranges=True,
+                complete_length=file_size
             )
-    
-    except Exception as e:
-        return jsonify({'error': f'Streaming error: {str(e)}'}), 500
+        except RequestedRangeNotSatisfiable as e:
+            audio_file.close()
+            # Content-Range tells the client the real length so it can retry
+            error = jsonify({'error': 'Requested range not satisfiable'})
+            error.headers['Content-Range'] = f'{e.units} */{e.length}'
+            return error, 416
+        except BaseException:
+            audio_file.close()
+            raise
     
     except Exception as e:
         return jsonify({'error': f'Streaming error: {str(e)}'}), 500
@@ -228,7 +237,7 @@ def stream_audio(filename):
 @app.route('/degrade/<filename>', methods=['POST'])
 def degrade_segment(filename):
     """
-    Degrade a specific segment of a track.
+    Queue degradation of a specific segment of a track.
     
     Args:
         filename: Name of WAV file
@@ -237,7 +246,7 @@ def degrade_segment(filename):
         segment_index: Index of segment to degrade
         
     Returns:
-        Success message
+        202 Accepted once the segment is queued for degradation
     """
     try:
         data = request.get_json()
@@ -246,8 +255,12 @@ def degrade_segment(filename):
         if segment_index is None:
             return jsonify({'error': 'segment_index required'}), 400
         
+        # Plays are applied after the response is sent, so reject bad input now
+        if isinstance(segment_index, bool) or not isinstance(segment_index, int):
+            return jsonify({'error': 'segment_index must be an integer'}), 400
+        
         # Get track metadata
-        metadata = metadata_manager.get_track_metadata(filename)
+        metadata = metadata_manager.get_track_metadata(filename, include_play_counts=False)
         if metadata is None:
             return jsonify({'error': 'Track not found'}), 404
         
@@ -255,48 +268,14 @@ def degrade_segment(filename):
         if segment_index < 0 or segment_index >= metadata['total_segments']:
             return jsonify({'error': 'Invalid segment index'}), 400
         
-        # Degrade the segment
-        file_path = os.path.join(app.config['AUDIO_DIR'], filename)
+        # Queue the play; segment writes are coalesced and applied in batches
+        degradation_queue.enqueue(filename, segment_index)
         
-        with lock_manager.segment_lock(filename, segment_index) as lock:
-            if lock.acquired:
-                # Get current play count
-                play_count = metadata['segment_play_counts'][segment_index]
-                
-                # Read segment
-                import wav_handler
-                audio_data, _ = wav_handler.read_segment(
-                    file_path,
-                    segment_index,
-                    app.config['SEGMENT_DURATION']
-                )
-                
-                # Apply degradation
-                import degradation
-                degraded_audio = degradation.apply_dropout(
-                    audio_data,
-                    play_count,
-                    app.config['DEGRADATION_RATE']
-                )
-                
-                # Write back
-                wav_handler.write_segment(
-                    file_path,
-                    segment_index,
-                    app.config['SEGMENT_DURATION'],
-                    degraded_audio
-                )
-                
-                # Increment play count
-                metadata_manager.increment_segment_play_count(filename, segment_index)
-                
-                return jsonify({
-                    'success': True,
-                    'segment_index': segment_index,
-                    'play_count': play_count + 1
-                })
-            else:
-                return jsonify({'error': 'Could not acquire lock'}), 503
+        return jsonify({
+            'success': True,
+            'segment_index': segment_index,
+            'queued': True
+        }), 202
     
     except Exception as e:
         return jsonify({'error': str(e)}), 500
@@ -343,6 +322,8 @@ def get_stats(filename):
 
 
 if __name__ == '__main__':
+    # Development server only; production runs wsgi:app under gunicorn
+    # with gunicorn.conf.py
     port = int(os.environ.get('PORT', 5000))
     debug = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
     app.run(host='0.0.0.0', port=port, debug=debug)
@@ -0,0 +1,179 @@
+"""
+Degradation Queue
+Coalesces segment degradation requests and applies them in batches.
+"""
+
+import atexit
+import threading
+from collections import defaultdict
+from typing import Dict, Optional
+
+import wav_handler
+import degradation
+from lock_manager import SegmentLockManager
+from metadata import MetadataManager
+
+
+class DegradationQueue:
+    """Buffers /degrade requests and applies each segment's plays in one read-modify-write."""
+    
+    def __init__(
+        self,
+        metadata_manager: MetadataManager,
+        lock_manager: SegmentLockManager,
+        segment_duration: float = 0.5,
+        degradation_rate: float = 1.0,
+        flush_interval: float = 0.25,
+        max_pending: int = 64
+    ):
+        """
+        Initialize degradation queue.
+        
+        Args:
+            metadata_manager: MetadataManager instance
+            lock_manager: SegmentLockManager instance
+            segment_duration: Duration of each segment in seconds
+            degradation_rate: Percentage of dropout per play (default: 1.0 = 1% per play)
+            flush_interval: Seconds to wait after the first queued play before flushing
+            max_pending: Number of queued plays that triggers a flush without waiting
+        """
+        self.metadata_manager = metadata_manager
+        self.lock_manager = lock_manager
+        self.segment_duration = segment_duration
+        self.degradation_rate = degradation_rate
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        
+        # filename -> {segment_index: queued plays}
+        self._pending: Dict[str, Dict[int, int]] = defaultdict(lambda: defaultdict(int))
+        self._pending_count = 0
+        self._queue_lock = threading.Lock()
+        self._timer: Optional[threading.Timer] = None
+        self._timer_delay = 0.0
+        
+        # Apply anything still buffered when the process exits
+        atexit.register(self.flush_all)
+    
+    def enqueue(self, filename: str, segment_index: int):
+        """
+        Queue one play of a segment for degradation.
+        
+        Args:
+            filename: Name of WAV file
+            segment_index: Index of segment to degrade
+        """
+        with self._queue_lock:
+            self._pending[filename][segment_index] += 1
+            self._pending_count += 1
+            
+            if self._pending_count >= self.max_pending:
+                # Wake the timer thread now; the request thread never touches disk
+                self._schedule_flush(0)
+            else:
+                self._schedule_flush()
+    
+    def _schedule_flush(self, delay: Optional[float] = None):
+        """
+        Start the flush timer, or bring a pending one forward (caller holds the queue lock).
+        
+        Args:
+            delay: Seconds until the flush (default: flush_interval)
+        """
+        if delay is None:
+            delay = self.flush_interval
+        
+        if self._timer is not None:
+            if self._timer_delay <= delay:
+                return
+            self._timer.cancel()
+        
+        self._timer = threading.Timer(delay, self.flush_all)
+        self._timer.daemon = True
+        self._timer_delay = delay
+        self._timer.start()
+    
+    def flush_all(self):
+        """Apply all queued degradation to disk."""
+        with self._queue_lock:
+            pending = self._pending
+            self._pending = defaultdict(lambda: defaultdict(int))
+            self._pending_count = 0
+            
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        
+        for filename, segments in pending.items():
+            for segment_index, plays in segments.items():
+                try:
+                    self._apply(filename, segment_index, plays)
+                except Exception as e:
+                    print(f"Error degrading segment {segment_index} of {filename}: {e}")
+    
+    def _apply(self, filename: str, segment_index: int, plays: int):
+        """
+        Degrade a segment once per queued play with a single read and write.
+        
+        Args:
+            filename: Name of WAV file
+            segment_index: Index of segment to degrade
+            plays: Number of queued plays to apply
+        """
+        with self.lock_manager.segment_lock(filename, segment_index) as lock:
+            if not lock.acquired:
+                # Leave the plays queued for the next flush
+                print(f"Lock timeout for segment {segment_index} of {filename}, requeueing {plays} play(s)")
+                with self._queue_lock:
+                    self._pending[filename][segment_index] += plays
+                    self._pending_count += plays
+                    self._schedule_flush()
+                return
+            
+            # Looked up under the lock so a replaced file's header is re-read
+            # before we write at its data offset
+            file_info = self.metadata_manager.get_file_info(filename)
+            if file_info is None:
+                print(f"Audio file not found: {filename}, dropping {plays} queued play(s)")
+                return
+            
+            play_counts = self.metadata_manager.get_segment_play_counts(filename)
+            if play_counts is None:
+                return
+            
+            play_count = int(play_counts[segment_index])
+            
+            try:
+                audio_data, _ = wav_handler.read_segment(
+                    file_info['path'],
+                    segment_index,
+                    self.segment_duration,
+                    file_info
+                )
+            except FileNotFoundError:
+                self.metadata_manager.forget_file(filename)
+                print(f"Audio file not found: {filename}, dropping {plays} queued play(s)")
+                return
+            
+            # Same result as `plays` separate requests, each seeing the next play count
+            for offset in range(plays):
+                audio_data = degradation.apply_dropout(
+                    audio_data,
+                    play_count + offset,
+                    self.degradation_rate
+                )
+            
+            try:
+                wav_handler.write_segment(
+                    file_info['path'],
+                    segment_index,
+                    self.segment_duration,
+                    audio_data,
+                    file_info
+                )
+            except FileNotFoundError:
+                self.metadata_manager.forget_file(filename)
+                print(f"Audio file not found: {filename}, dropping {plays} queued play(s)")
+                return
+            
+            self.metadata_manager.record_file_write(filename)
+            self.metadata_manager.increment_segment_play_count(filename, segment_index, plays)
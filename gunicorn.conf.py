@@ -0,0 +1,19 @@
+"""
+Gunicorn configuration
+Loaded automatically when gunicorn is started from the project root.
+"""
+
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.environ.get('PORT', '5000')}"
+
+# One process per core; segment locks and play counts are shared across
+# workers through files in METADATA_DIR
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count()))
+
+# Streams are I/O-bound, so each worker serves several listeners on threads
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '8'))
+
+timeout = 120
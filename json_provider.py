@@ -0,0 +1,53 @@
+"""
+JSON Provider
+Flask JSON provider backed by orjson for faster response serialization.
+"""
+
+from typing import Any
+
+import orjson
+from flask.json.provider import JSONProvider
+
+# NumPy scalars/arrays (e.g. play counts) serialize without a .tolist() pass
+ORJSON_OPTIONS = orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS
+
+
+class OrjsonProvider(JSONProvider):
+    """Serializes responses with orjson instead of the stdlib json module."""
+    
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        """
+        Serialize data as a JSON string.
+        
+        Args:
+            obj: Data to serialize
+            
+        Returns:
+            JSON string
+        """
+        return orjson.dumps(obj, option=ORJSON_OPTIONS).decode()
+    
+    def loads(self, s, **kwargs: Any) -> Any:
+        """
+        Deserialize data from a JSON string or bytes.
+        
+        Args:
+            s: JSON text or bytes
+            
+        Returns:
+            Deserialized data
+        """
+        return orjson.loads(s)
+    
+    def response(self, *args: Any, **kwargs: Any):
+        """
+        Build a JSON response, writing orjson's bytes output directly.
+        
+        Returns:
+            Flask response with application/json mimetype
+        """
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(
+            orjson.dumps(obj, option=ORJSON_OPTIONS),
+            mimetype='application/json'
+        )
@@ -3,23 +3,37 @@ Segment Lock Manager
 Coordinates concurrent access to audio file segments.
 """
 
+import fcntl
+import os
 import threading
-from typing import Dict, Tuple
+import time
+from typing import Dict, Optional, Tuple
+
+# Interval between non-blocking attempts on a cross-process segment lock
+LOCK_POLL_INTERVAL = 0.01
 
 
 class SegmentLockManager:
     """Manages locks for individual audio segments to prevent concurrent writes."""
     
-    def __init__(self, timeout: float = 5.0):
+    def __init__(self, timeout: float = 5.0, lock_dir: Optional[str] = None):
         """
         Initialize segment lock manager.
         
         Args:
             timeout: Maximum time to wait for lock acquisition in seconds
+            lock_dir: Directory for per-track lock files. When set, segment locks
+                also exclude other processes (e.g. gunicorn workers) using the
+                same directory; otherwise they only exclude threads.
         """
         self.timeout = timeout
+        self.lock_dir = lock_dir
         self._locks: Dict[Tuple[str, int], threading.Lock] = {}
+        self._lock_files: Dict[str, int] = {}
         self._lock_creation_lock = threading.Lock()
+        
+        if lock_dir is not None:
+            os.makedirs(lock_dir, exist_ok=True)
     
     def _get_lock(self, filename: str, segment_index: int) -> threading.Lock:
         """
@@ -39,6 +53,48 @@ class SegmentLockManager:
                 self._locks[key] = threading.Lock()
             return self._locks[key]
     
+    def _get_lock_file(self, filename: str) -> int:
+        """
+        Get or open the lock file descriptor for a track.
+        
+        Descriptors stay open for the life of the manager: closing any descriptor
+        for a file drops every POSIX lock this process holds on it.
+        
+        Args:
+            filename: Name of audio file
+            
+        Returns:
+            File descriptor of the track's lock file
+        """
+        with self._lock_creation_lock:
+            if filename not in self._lock_files:
+                lock_path = os.path.join(self.lock_dir, f"{filename}.lock")
+                self._lock_files[filename] = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            return self._lock_files[filename]
+    
+    def _acquire_file_lock(self, filename: str, segment_index: int, deadline: float) -> bool:
+        """
+        Lock one byte of the track's lock file, keyed by segment index.
+        
+        Args:
+            filename: Name of audio file
+            segment_index: Index of segment
+            deadline: time.monotonic() value to give up at
+            
+        Returns:
+            True if lock acquired, False on timeout
+        """
+        fd = self._get_lock_file(filename)
+        
+        while True:
+            try:
+                fcntl.lockf(fd, fcntl.LOCK_EX | fcntl.LOCK_NB, 1, segment_index)
+                return True
+            except OSError:
+                if time.monotonic() >= deadline:
+                    return False
+                time.sleep(LOCK_POLL_INTERVAL)
+    
     def acquire_lock(self, filename: str, segment_index: int) -> bool:
         """
         Acquire exclusive lock for a specific segment.
@@ -50,8 +106,26 @@ class SegmentLockManager:
         Returns:
             True if lock acquired, False on timeout
         """
+        deadline = time.monotonic() + self.timeout
         lock = self._get_lock(filename, segment_index)
-        return lock.acquire(timeout=self.timeout)
+        
+        if not lock.acquire(timeout=self.timeout):
+            return False
+        
+        if self.lock_dir is None:
+            return True
+        
+        # Thread lock held: only this thread in the process asks for the file lock
+        try:
+            acquired = self._acquire_file_lock(filename, segment_index, deadline)
+        except BaseException:
+            # e.g. EMFILE opening the lock file; don't leave the segment wedged
+            lock.release()
+            raise
+        
+        if not acquired:
+            lock.release()
+        return acquired
     
     def release_lock(self, filename: str, segment_index: int):
         """
@@ -61,6 +135,10 @@ class SegmentLockManager:
             filename: Name of audio file
             segment_index: Index of segment
         """
+        if self.lock_dir is not None:
+            fd = self._get_lock_file(filename)
+            fcntl.lockf(fd, fcntl.LOCK_UN, 1, segment_index)
+        
         lock = self._get_lock(filename, segment_index)
         try:
             lock.release()
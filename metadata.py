@@ -1,15 +1,26 @@
 """
 Metadata Manager
 Tracks segment play counts and manages track metadata.
+
+Track metadata is stored as msgpack; per-segment play counts live in a raw
+int32 sidecar file that is memory-mapped, so every worker process shares
+the same counts without rewriting the metadata on each play. JSON is only
+used at the HTTP boundary (and read once to migrate older metadata files).
 """
 
+import fcntl
 import os
 import json
+import stat
 import threading
+from contextlib import contextmanager
 from datetime import datetime
 from typing import Dict, List, Optional
 from pathlib import Path
 
+import msgpack
+import numpy as np
+
 import wav_handler
 
 
@@ -22,31 +33,172 @@ class MetadataManager:
         
         Args:
             audio_dir: Directory containing WAV files
-            metadata_dir: Directory for metadata JSON files
+            metadata_dir: Directory for metadata and play count files
             segment_duration: Duration of each segment in seconds
         """
         self.audio_dir = audio_dir
         self.metadata_dir = metadata_dir
+        self.lock_dir = os.path.join(metadata_dir, 'locks')
         self.segment_duration = segment_duration
         self._locks = {}  # Per-track locks for metadata updates
         self._lock_creation_lock = threading.Lock()
+        self._files = {}  # filename -> path, size and WAV parameters
+        self._plays = {}  # filename -> memory-mapped int32 segment play counts
         
         # Ensure directories exist
         os.makedirs(audio_dir, exist_ok=True)
         os.makedirs(metadata_dir, exist_ok=True)
+        os.makedirs(self.lock_dir, exist_ok=True)
     
     def _get_metadata_path(self, filename: str) -> str:
         """Get path to metadata file for a track."""
         base_name = os.path.splitext(filename)[0]
+        return os.path.join(self.metadata_dir, f"{base_name}.meta.mp")
+    
+    def _get_legacy_metadata_path(self, filename: str) -> str:
+        """Get path to a JSON metadata file written by older versions."""
+        base_name = os.path.splitext(filename)[0]
         return os.path.join(self.metadata_dir, f"{base_name}.json")
     
-    def _get_track_lock(self, filename: str) -> threading.Lock:
+    def _get_plays_path(self, filename: str) -> str:
+        """Get path to segment play count file for a track."""
+        base_name = os.path.splitext(filename)[0]
+        return os.path.join(self.metadata_dir, f"{base_name}.plays.bin")
+    
+    def _get_track_lock(self, filename: str) -> threading.RLock:
         """Get or create a lock for a specific track."""
         with self._lock_creation_lock:
             if filename not in self._locks:
-                self._locks[filename] = threading.Lock()
+                self._locks[filename] = threading.RLock()
             return self._locks[filename]
     
+    @contextmanager
+    def _metadata_lock(self, filename: str):
+        """
+        Hold a track's metadata exclusively across threads and processes.
+        
+        Guards read-modify-write of the metadata file so concurrent gunicorn
+        workers don't lose each other's updates.
+        
+        Args:
+            filename: Name of WAV file
+        """
+        base_name = os.path.splitext(filename)[0]
+        # Alongside the segment lock files, not the data files
+        lock_path = os.path.join(self.lock_dir, f"{base_name}.meta.lock")
+        
+        with self._get_track_lock(filename):
+            fd = os.open(lock_path, os.O_RDWR | os.O_CREAT, 0o644)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                yield
+            finally:
+                # Closing the descriptor releases the flock
+                os.close(fd)
+    
+    def _get_tmp_path(self, path: str) -> str:
+        """Get a temporary path unique to this process and thread."""
+        return f"{path}.tmp{os.getpid()}.{threading.get_ident()}"
+    
+    def _migrate_legacy_metadata(self, filename: str) -> bool:
+        """
+        Convert a JSON metadata file from older versions to msgpack.
+        
+        Args:
+            filename: Name of WAV file
+            
+        Returns:
+            True if a JSON metadata file was migrated
+        """
+        legacy_path = self._get_legacy_metadata_path(filename)
+        
+        if not os.path.exists(legacy_path):
+            return False
+        
+        with open(legacy_path, 'r') as f:
+            metadata = json.load(f)
+        
+        self._write_metadata(filename, metadata)
+        
+        try:
+            os.remove(legacy_path)
+        except FileNotFoundError:
+            # Another worker migrated it first
+            pass
+        
+        return True
+    
+    def _load_metadata(self, filename: str) -> Optional[Dict]:
+        """Read the metadata file for a track as stored on disk."""
+        metadata_path = self._get_metadata_path(filename)
+        
+        if not os.path.exists(metadata_path) and not self._migrate_legacy_metadata(filename):
+            return None
+        
+        with open(metadata_path, 'rb') as f:
+            return msgpack.unpackb(f.read())
+    
+    def _write_metadata(self, filename: str, metadata: Dict):
+        """Atomically write the metadata file for a track."""
+        metadata_path = self._get_metadata_path(filename)
+        tmp_path = self._get_tmp_path(metadata_path)
+        with open(tmp_path, 'wb') as f:
+            f.write(msgpack.packb(metadata))
+        os.replace(tmp_path, metadata_path)
+    
+    def _write_play_counts(self, filename: str, play_counts):
+        """Atomically create the play count file for a track."""
+        plays_path = self._get_plays_path(filename)
+        tmp_path = self._get_tmp_path(plays_path)
+        np.asarray(play_counts, dtype=np.int32).tofile(tmp_path)
+        os.replace(tmp_path, plays_path)
+    
+    def get_segment_play_counts(self, filename: str) -> Optional[np.ndarray]:
+        """
+        Get the shared play count array for a track.
+        
+        Metadata written before play counts moved to a sidecar file is
+        migrated on first access.
+        
+        Args:
+            filename: Name of WAV file
+            
+        Returns:
+            Memory-mapped int32 array indexed by segment, or None if not found
+        """
+        plays = self._plays.get(filename)
+        if plays is not None:
+            return plays
+        
+        # Migration rewrites the metadata file, so lock out other workers
+        with self._metadata_lock(filename):
+            plays = self._plays.get(filename)
+            if plays is not None:
+                return plays
+            
+            plays_path = self._get_plays_path(filename)
+            
+            if not os.path.exists(plays_path):
+                metadata = self._load_metadata(filename)
+                if metadata is None:
+                    return None
+                
+                legacy_counts = metadata.pop('segment_play_counts', None)
+                if legacy_counts is None:
+                    legacy_counts = [0] * metadata['total_segments']
+                
+                self._write_play_counts(filename, legacy_counts)
+                self._write_metadata(filename, metadata)
+            
+            if os.path.getsize(plays_path) == 0:
+                # Zero-length files can't be memory-mapped
+                plays = np.zeros(0, dtype=np.int32)
+            else:
+                plays = np.memmap(plays_path, dtype=np.int32, mode='r+')
+            
+            self._plays[filename] = plays
+            return plays
+    
     def scan_and_initialize(self) -> List[str]:
         """
         Scan audio directory and initialize metadata for new WAV files.
@@ -63,6 +215,19 @@ class MetadataManager:
             if filename.lower().endswith('.wav'):
                 metadata_path = self._get_metadata_path(filename)
                 
+                try:
+                    self._index_file(filename)
+                except Exception as e:
+                    print(f"Error reading WAV info for {filename}: {e}")
+                
+                # Existing tracks from older versions keep their JSON metadata's state
+                try:
+                    self._migrate_legacy_metadata(filename)
+                except Exception as e:
+                    # Leave the JSON in place rather than resetting the track
+                    print(f"Error migrating metadata for {filename}: {e}")
+                    continue
+                
                 # Initialize metadata if it doesn't exist
                 if not os.path.exists(metadata_path):
                     try:
@@ -73,6 +238,96 @@ class MetadataManager:
         
         return initialized
     
+    def _index_file(self, filename: str, file_stat: Optional[os.stat_result] = None) -> Dict:
+        """Stat a WAV file and cache its path, size and WAV parameters."""
+        file_path = os.path.join(self.audio_dir, filename)
+        if file_stat is None:
+            file_stat = os.stat(file_path)
+        info = wav_handler.get_wav_info(file_path)
+        info['path'] = file_path
+        info['size'] = file_stat.st_size
+        info['inode'] = file_stat.st_ino
+        info['mtime_ns'] = file_stat.st_mtime_ns
+        self._files[filename] = info
+        return info
+    
+    def get_file_info(self, filename: str) -> Optional[Dict]:
+        """
+        Look up a WAV file in the in-memory file index.
+        
+        Files are indexed by scan_and_initialize; files added afterwards are
+        indexed on first lookup. Each lookup checks the cached entry against a
+        stat() of the file: deleted files are dropped from the index, and
+        replaced or rewritten files have their header re-parsed so size and
+        data offset are never stale.
+        
+        Args:
+            filename: Name of WAV file
+            
+        Returns:
+            Dictionary with path, size and get_wav_info fields, or None if not found
+        """
+        if os.path.basename(filename) != filename or not filename.lower().endswith('.wav'):
+            return None
+        
+        try:
+            file_stat = os.stat(os.path.join(self.audio_dir, filename))
+        except OSError:
+            self.forget_file(filename)
+            return None
+        
+        if not stat.S_ISREG(file_stat.st_mode):
+            self.forget_file(filename)
+            return None
+        
+        info = self._files.get(filename)
+        if (info is not None
+                and info['inode'] == file_stat.st_ino
+                and info['size'] == file_stat.st_size
+                and info['mtime_ns'] == file_stat.st_mtime_ns):
+            return info
+        
+        try:
+            return self._index_file(filename, file_stat)
+        except Exception as e:
+            print(f"Error reading WAV info for {filename}: {e}")
+            self.forget_file(filename)
+            return None
+    
+    def record_file_write(self, filename: str):
+        """
+        Refresh a file's cached mtime after writing its samples in place.
+        
+        Degradation rewrites audio data without touching the header, so the
+        index entry stays valid; without this every write would force the next
+        lookup to re-parse the header.
+        
+        Args:
+            filename: Name of WAV file
+        """
+        info = self._files.get(filename)
+        if info is None:
+            return
+        
+        try:
+            file_stat = os.stat(info['path'])
+        except OSError:
+            self.forget_file(filename)
+            return
+        
+        # Leave a file replaced since it was indexed for get_file_info to re-read
+        if info['inode'] == file_stat.st_ino and info['size'] == file_stat.st_size:
+            info['mtime_ns'] = file_stat.st_mtime_ns
+    
+    def forget_file(self, filename: str):
+        """
+        Drop a WAV file from the in-memory file index.
+        
+        Args:
+            filename: Name of WAV file
+        """
+        self._files.pop(filename, None)
+    
     def initialize_track_metadata(self, filename: str):
         """
         Create metadata file for a new track.
@@ -80,11 +335,15 @@ class MetadataManager:
         Args:
             filename: Name of WAV file
         """
-        file_path = os.path.join(self.audio_dir, filename)
-        
         # Get WAV file info
-        wav_info = wav_handler.get_wav_info(file_path)
-        total_segments = wav_handler.calculate_total_segments(file_path, self.segment_duration)
+        wav_info = self.get_file_info(filename)
+        if wav_info is None:
+            raise FileNotFoundError(f"Audio file not found: {filename}")
+        total_segments = wav_handler.calculate_total_segments(
+            wav_info['path'],
+            self.segment_duration,
+            wav_info
+        )
         
         # Create metadata structure
         metadata = {
@@ -93,62 +352,66 @@ class MetadataManager:
             'duration': wav_info['duration'],
             'segment_duration': self.segment_duration,
             'total_segments': total_segments,
-            'segment_play_counts': [0] * total_segments,
             'created_at': datetime.utcnow().isoformat() + 'Z',
             'total_streams': 0
         }
         
-        # Write metadata file
-        metadata_path = self._get_metadata_path(filename)
-        with open(metadata_path, 'w') as f:
-            json.dump(metadata, f, indent=2)
+        # Write play counts first so the metadata file never exists without them
+        self._write_play_counts(filename, np.zeros(total_segments, dtype=np.int32))
+        self._write_metadata(filename, metadata)
     
-    def get_track_metadata(self, filename: str) -> Optional[Dict]:
+    def get_track_metadata(self, filename: str, include_play_counts: bool = True) -> Optional[Dict]:
         """
         Load metadata for a track.
         
         Args:
             filename: Name of WAV file
+            include_play_counts: Add segment_play_counts as a list (default: True)
             
         Returns:
             Metadata dictionary or None if not found
         """
-        metadata_path = self._get_metadata_path(filename)
-        
-        if not os.path.exists(metadata_path):
-            return None
-        
         try:
-            with open(metadata_path, 'r') as f:
-                return json.load(f)
+            metadata = self._load_metadata(filename)
+            
+            if metadata is None:
+                return None
+            
+            # Sidecar file is authoritative over any legacy inline counts
+            metadata.pop('segment_play_counts', None)
+            if include_play_counts:
+                metadata['segment_play_counts'] = self.get_segment_play_counts(filename).tolist()
+            
+            return metadata
         except Exception as e:
             print(f"Error loading metadata for {filename}: {e}")
             return None
     
-    def increment_segment_play_count(self, filename: str, segment_index: int):
+    def increment_segment_play_count(self, filename: str, segment_index: int, count: int = 1):
         """
-        Atomically increment play count for a segment.
+        Increment play count for a segment.
+        
+        The update is a read-modify-write on a mapping shared by every worker
+        process, and the track lock taken here only covers this process.
+        Callers must hold the segment's SegmentLockManager lock, as
+        DegradationQueue._apply does.
         
         Args:
             filename: Name of WAV file
             segment_index: Index of segment to increment
+            count: Number of plays to add (default: 1)
         """
         lock = self._get_track_lock(filename)
         
         with lock:
-            metadata = self.get_track_metadata(filename)
+            plays = self.get_segment_play_counts(filename)
             
-            if metadata is None:
+            if plays is None:
                 return
             
-            # Increment play count
-            if 0 <= segment_index < len(metadata['segment_play_counts']):
-                metadata['segment_play_counts'][segment_index] += 1
-            
-            # Write back to file
-            metadata_path = self._get_metadata_path(filename)
-            with open(metadata_path, 'w') as f:
-                json.dump(metadata, f, indent=2)
+            # Increment play count in the shared mapping
+            if 0 <= segment_index < len(plays):
+                plays[segment_index] += count
     
     def increment_total_streams(self, filename: str):
         """
@@ -157,10 +420,13 @@ class MetadataManager:
         Args:
             filename: Name of WAV file
         """
-        lock = self._get_track_lock(filename)
-        
-        with lock:
-            metadata = self.get_track_metadata(filename)
+        with self._metadata_lock(filename):
+            try:
+                metadata = self._load_metadata(filename)
+            except Exception as e:
+                # Unreadable metadata shouldn't fail the stream; skip the counter
+                print(f"Error loading metadata for {filename}: {e}")
+                return
             
             if metadata is None:
                 return
@@ -168,9 +434,7 @@ class MetadataManager:
             metadata['total_streams'] = metadata.get('total_streams', 0) + 1
             
             # Write back to file
-            metadata_path = self._get_metadata_path(filename)
-            with open(metadata_path, 'w') as f:
-                json.dump(metadata, f, indent=2)
+            self._write_metadata(filename, metadata)
     
     def get_overall_degradation(self, filename: str, degradation_rate: float = 1.0) -> float:
         """
@@ -183,21 +447,27 @@ class MetadataManager:
         Returns:
             Overall degradation percentage (0-100)
         """
-        metadata = self.get_track_metadata(filename)
+        try:
+            plays = self.get_segment_play_counts(filename)
+        except Exception as e:
+            print(f"Error loading play counts for {filename}: {e}")
+            return 0.0
         
-        if metadata is None or not metadata['segment_play_counts']:
+        if plays is None or len(plays) == 0:
             return 0.0
         
-        play_counts = metadata['segment_play_counts']
-        avg_play_count = sum(play_counts) / len(play_counts)
+        avg_play_count = float(plays.mean())
         
         # Convert to percentage with degradation rate (capped at 100%)
         return min(avg_play_count * degradation_rate, 100.0)
     
-    def get_all_tracks(self) -> List[Dict]:
+    def get_all_tracks(self, degradation_rate: float = 1.0) -> List[Dict]:
         """
         Get metadata for all tracks in audio directory.
         
+        Args:
+            degradation_rate: Percentage of dropout per play (default: 1.0)
+            
         Returns:
             List of metadata dictionaries with degradation info
         """
@@ -208,11 +478,10 @@ class MetadataManager:
         
         for filename in os.listdir(self.audio_dir):
             if filename.lower().endswith('.wav'):
-                metadata = self.get_track_metadata(filename)
+                metadata = self.get_track_metadata(filename, include_play_counts=False)
                 
                 if metadata:
-                    # Add degradation info (using default rate of 1.0 for listing)
-                    metadata['overall_degradation'] = self.get_overall_degradation(filename, 1.0)
+                    metadata['overall_degradation'] = self.get_overall_degradation(filename, degradation_rate)
                     tracks.append(metadata)
         
         return tracks
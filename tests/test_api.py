@@ -6,6 +6,7 @@ import pytest
 import json
 import os
 import tempfile
+import time
 import shutil
 from pathlib import Path
 
@@ -65,6 +66,7 @@ def client(test_audio_files):
     from app import metadata_manager, lock_manager, streaming_service
     metadata_manager.__init__(audio_dir, metadata_dir, 0.5)
     metadata_manager.scan_and_initialize()
+    lock_manager.__init__(5.0, os.path.join(metadata_dir, 'locks'))
     
     with app.test_client() as client:
         yield client
@@ -111,6 +113,25 @@ class TestTracksEndpoint:
         for track in data:
             assert track['overall_degradation'] == 0.0
             assert track['total_streams'] == 0
+    
+    def test_tracks_etag(self, client):
+        """Test unchanged track list revalidates with 304"""
+        from app import degradation_queue
+        
+        response = client.get('/tracks')
+        etag = response.headers['ETag']
+        
+        response = client.get('/tracks', headers={'If-None-Match': etag})
+        assert response.status_code == 304
+        assert response.data == b''
+        
+        # A new play changes the listing and its ETag
+        client.post('/degrade/short-track.wav', json={'segment_index': 0})
+        degradation_queue.flush_all()
+        
+        response = client.get('/tracks', headers={'If-None-Match': etag})
+        assert response.status_code == 200
+        assert response.headers['ETag'] != etag
 
 
 class TestStatsEndpoint:
@@ -147,6 +168,33 @@ class TestStreamingEndpoint:
         data = response.data
         assert len(data) > 0
     
+    def test_stream_deleted_file(self, client, test_audio_files):
+        """Test streaming a file deleted after startup returns 404"""
+        audio_dir, _ = test_audio_files
+        os.remove(os.path.join(audio_dir, 'short-track.wav'))
+        
+        response = client.get('/stream/short-track.wav')
+        assert response.status_code == 404
+    
+    def test_stream_range_request(self, client):
+        """Test GET /stream/<filename> honours byte ranges for seeking"""
+        response = client.get('/stream/short-track.wav', headers={'Range': 'bytes=0-1023'})
+        assert response.status_code == 206
+        assert response.headers['Content-Range'].startswith('bytes 0-1023/')
+        assert response.headers['Accept-Ranges'] == 'bytes'
+        assert len(response.data) == 1024
+        assert response.data[:4] == b'RIFF'
+    
+    def test_stream_range_not_satisfiable(self, client, test_audio_files):
+        """Test out-of-bounds byte range returns 416 with the file's length"""
+        audio_dir, _ = test_audio_files
+        
+        response = client.get('/stream/short-track.wav', headers={'Range': 'bytes=99999999-'})
+        assert response.status_code == 416
+        
+        file_size = os.path.getsize(os.path.join(audio_dir, 'short-track.wav'))
+        assert response.headers['Content-Range'] == f'bytes */{file_size}'
+    
     def test_stream_increments_play_count(self, client):
         """Test streaming increments segment play counts"""
         # Stream the track (consume all data to complete streaming)
@@ -202,6 +250,148 @@ class TestStreamingEndpoint:
 
 
 
+class TestDegradeEndpoint:
+    """Test segment degradation endpoint"""
+    
+    def test_degrade_queues_segment(self, client):
+        """Test POST /degrade/<filename> accepts a play and records it on flush"""
+        from app import degradation_queue
+        
+        response = client.post('/degrade/short-track.wav', json={'segment_index': 1})
+        assert response.status_code == 202
+        
+        data = json.loads(response.data)
+        assert data['success'] is True
+        assert data['segment_index'] == 1
+        
+        degradation_queue.flush_all()
+        
+        response = client.get('/stats/short-track.wav')
+        data = json.loads(response.data)
+        assert data['segment_play_counts'] == [0, 1, 0, 0]
+    
+    def test_degrade_coalesces_plays(self, client):
+        """Test repeated plays of a segment are applied together"""
+        from app import degradation_queue
+        
+        for _ in range(3):
+            client.post('/degrade/short-track.wav', json={'segment_index': 0})
+        client.post('/degrade/short-track.wav', json={'segment_index': 2})
+        
+        degradation_queue.flush_all()
+        
+        response = client.get('/stats/short-track.wav')
+        data = json.loads(response.data)
+        assert data['segment_play_counts'] == [3, 0, 1, 0]
+    
+    def test_degrade_applies_dropout(self, client, test_audio_files, monkeypatch):
+        """Test coalesced plays are applied to the segment's samples"""
+        from app import degradation_queue
+        import wav_handler
+        
+        audio_dir, _ = test_audio_files
+        file_path = os.path.join(audio_dir, 'short-track.wav')
+        
+        # 100% per play: the first play leaves the audio intact, the second silences it
+        monkeypatch.setattr(degradation_queue, 'degradation_rate', 100.0)
+        
+        client.post('/degrade/short-track.wav', json={'segment_index': 1})
+        client.post('/degrade/short-track.wav', json={'segment_index': 1})
+        degradation_queue.flush_all()
+        
+        untouched, _ = wav_handler.read_segment(file_path, 0, 0.5)
+        degraded, _ = wav_handler.read_segment(file_path, 1, 0.5)
+        assert untouched.any()
+        assert not degraded.any()
+    
+    def test_degrade_requeues_on_lock_timeout(self, client, monkeypatch):
+        """Test a play whose segment lock times out is kept for the next flush"""
+        from app import degradation_queue, lock_manager
+        
+        monkeypatch.setattr(lock_manager, 'timeout', 0.05)
+        monkeypatch.setattr(degradation_queue, 'flush_interval', 60.0)
+        
+        client.post('/degrade/short-track.wav', json={'segment_index': 2})
+        
+        # Hold the segment as a concurrent writer would
+        assert lock_manager.acquire_lock('short-track.wav', 2)
+        try:
+            degradation_queue.flush_all()
+        finally:
+            lock_manager.release_lock('short-track.wav', 2)
+        
+        response = client.get('/stats/short-track.wav')
+        assert json.loads(response.data)['segment_play_counts'] == [0, 0, 0, 0]
+        
+        degradation_queue.flush_all()
+        
+        response = client.get('/stats/short-track.wav')
+        assert json.loads(response.data)['segment_play_counts'] == [0, 0, 1, 0]
+    
+    def test_degrade_batch_flush_does_not_block_request(self, client, monkeypatch):
+        """Test reaching the batch size flushes on the timer thread, not the request"""
+        from app import degradation_queue, lock_manager
+        
+        monkeypatch.setattr(lock_manager, 'timeout', 2.0)
+        monkeypatch.setattr(degradation_queue, 'flush_interval', 60.0)
+        monkeypatch.setattr(degradation_queue, 'max_pending', 1)
+        
+        assert lock_manager.acquire_lock('short-track.wav', 3)
+        try:
+            start = time.monotonic()
+            response = client.post('/degrade/short-track.wav', json={'segment_index': 3})
+            elapsed = time.monotonic() - start
+        finally:
+            lock_manager.release_lock('short-track.wav', 3)
+        
+        assert response.status_code == 202
+        assert elapsed < 1.0
+        
+        deadline = time.monotonic() + 5.0
+        while time.monotonic() < deadline:
+            response = client.get('/stats/short-track.wav')
+            if json.loads(response.data)['segment_play_counts'] == [0, 0, 0, 1]:
+                break
+            time.sleep(0.05)
+        assert json.loads(response.data)['segment_play_counts'] == [0, 0, 0, 1]
+    
+    def test_degrade_keeps_file_index_entry(self, client, monkeypatch):
+        """Test writing degraded samples does not force a header re-parse"""
+        from app import degradation_queue
+        import wav_handler
+        
+        client.post('/degrade/short-track.wav', json={'segment_index': 0})
+        
+        calls = []
+        original = wav_handler.get_wav_info
+        monkeypatch.setattr(
+            wav_handler, 'get_wav_info',
+            lambda *args, **kwargs: calls.append(args) or original(*args, **kwargs)
+        )
+        
+        degradation_queue.flush_all()
+        response = client.get('/stream/short-track.wav')
+        _ = response.data
+        
+        assert calls == []
+    
+    def test_degrade_invalid_segment(self, client):
+        """Test out-of-range segment index is rejected"""
+        response = client.post('/degrade/short-track.wav', json={'segment_index': 99})
+        assert response.status_code == 400
+    
+    def test_degrade_non_integer_segment(self, client):
+        """Test non-integer segment indexes are rejected before queueing"""
+        for segment_index in (1.5, True, '1'):
+            response = client.post('/degrade/short-track.wav', json={'segment_index': segment_index})
+            assert response.status_code == 400
+    
+    def test_degrade_not_found(self, client):
+        """Test degrading a non-existent track"""
+        response = client.post('/degrade/nonexistent.wav', json={'segment_index': 0})
+        assert response.status_code == 404
+
+
 class TestCORS:
     """Test CORS headers"""
     
@@ -0,0 +1,60 @@
+"""
+Tests for segment locking
+"""
+
+import pytest
+import os
+import tempfile
+import shutil
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+from lock_manager import SegmentLockManager
+
+
+@pytest.fixture
+def lock_dir():
+    """Create temporary lock directory"""
+    temp_dir = tempfile.mkdtemp()
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+class TestSegmentLocking:
+    """Test segment lock acquisition and release"""
+    
+    def test_locks_other_managers(self, lock_dir):
+        """Test a segment held by one manager (process) times out for another"""
+        first = SegmentLockManager(timeout=0.1, lock_dir=lock_dir)
+        
+        assert first.acquire_lock('test.wav', 0)
+        
+        # Separate process, as gunicorn workers would be
+        pid = os.fork()
+        if pid == 0:
+            second = SegmentLockManager(timeout=0.1, lock_dir=lock_dir)
+            held = second.acquire_lock('test.wav', 0)
+            other_segment = second.acquire_lock('test.wav', 1)
+            os._exit(0 if (not held and other_segment) else 1)
+        
+        _, status = os.waitpid(pid, 0)
+        assert os.WEXITSTATUS(status) == 0
+        
+        first.release_lock('test.wav', 0)
+    
+    def test_file_lock_error_releases_thread_lock(self, lock_dir):
+        """Test a failure opening the lock file doesn't leave the segment held"""
+        manager = SegmentLockManager(timeout=0.1, lock_dir=lock_dir)
+        get_lock_file = manager._get_lock_file
+        
+        def fail(filename):
+            raise OSError(24, 'Too many open files')
+        
+        manager._get_lock_file = fail
+        with pytest.raises(OSError):
+            manager.acquire_lock('test.wav', 0)
+        
+        manager._get_lock_file = get_lock_file
+        assert manager.acquire_lock('test.wav', 0)
+        manager.release_lock('test.wav', 0)
@@ -3,6 +3,8 @@ Tests for metadata management
 """
 
 import pytest
+import json
+import msgpack
 import os
 import tempfile
 import shutil
@@ -57,9 +59,54 @@ class TestMetadataInitialization:
         assert 'test.wav' in initialized
         
         # Check metadata file was created
-        metadata_path = os.path.join(metadata_dir, 'test.json')
+        metadata_path = os.path.join(metadata_dir, 'test.meta.mp')
         assert os.path.exists(metadata_path)
     
+    def test_play_counts_stored_in_sidecar(self, manager, temp_dirs):
+        """Test play counts live in a binary file, not the msgpack metadata"""
+        audio_dir, metadata_dir = temp_dirs
+        
+        test_file = os.path.join(audio_dir, 'test.wav')
+        create_test_wav(test_file, duration=2)
+        manager.scan_and_initialize()
+        
+        plays_path = os.path.join(metadata_dir, 'test.plays.bin')
+        assert os.path.getsize(plays_path) == 4 * 4
+        
+        with open(os.path.join(metadata_dir, 'test.meta.mp'), 'rb') as f:
+            assert 'segment_play_counts' not in msgpack.unpackb(f.read())
+    
+    def test_legacy_json_metadata_migrated(self, manager, temp_dirs):
+        """Test JSON metadata with inline play counts is migrated"""
+        audio_dir, metadata_dir = temp_dirs
+        
+        test_file = os.path.join(audio_dir, 'test.wav')
+        create_test_wav(test_file, duration=2)
+        manager.scan_and_initialize()
+        
+        # Rewrite as the old format: JSON with inline counts, no sidecar
+        metadata = manager.get_track_metadata('test.wav', include_play_counts=False)
+        metadata['segment_play_counts'] = [3, 0, 1, 0]
+        metadata['total_streams'] = 5
+        legacy_path = os.path.join(metadata_dir, 'test.json')
+        with open(legacy_path, 'w') as f:
+            json.dump(metadata, f)
+        os.remove(os.path.join(metadata_dir, 'test.meta.mp'))
+        os.remove(os.path.join(metadata_dir, 'test.plays.bin'))
+        
+        # Startup scan must migrate, not re-initialize, the track
+        migrated = MetadataManager(audio_dir, metadata_dir, segment_duration=0.5)
+        assert migrated.scan_and_initialize() == []
+        
+        metadata = migrated.get_track_metadata('test.wav')
+        assert metadata['segment_play_counts'] == [3, 0, 1, 0]
+        assert metadata['total_streams'] == 5
+        assert not os.path.exists(legacy_path)
+        assert os.path.exists(os.path.join(metadata_dir, 'test.plays.bin'))
+        
+        with open(os.path.join(metadata_dir, 'test.meta.mp'), 'rb') as f:
+            assert 'segment_play_counts' not in msgpack.unpackb(f.read())
+    
     def test_metadata_structure(self, manager, temp_dirs):
         """Test metadata has correct structure"""
         audio_dir, metadata_dir = temp_dirs
@@ -82,6 +129,70 @@ class TestMetadataInitialization:
         assert metadata['total_streams'] == 0
 
 
+class TestFileIndex:
+    """Test in-memory audio file index"""
+    
+    def test_scan_indexes_files(self, manager, temp_dirs):
+        """Test scanning caches path, size and WAV parameters"""
+        audio_dir, _ = temp_dirs
+        
+        test_file = os.path.join(audio_dir, 'test.wav')
+        create_test_wav(test_file, duration=2)
+        manager.scan_and_initialize()
+        
+        info = manager.get_file_info('test.wav')
+        assert info['path'] == test_file
+        assert info['size'] == os.path.getsize(test_file)
+        assert info['sample_rate'] == 44100
+        assert info['channels'] == 2
+        assert info['sample_width'] == 2
+    
+    def test_file_added_after_scan(self, manager, temp_dirs):
+        """Test files added after startup are indexed on lookup"""
+        audio_dir, _ = temp_dirs
+        manager.scan_and_initialize()
+        
+        create_test_wav(os.path.join(audio_dir, 'late.wav'), duration=1)
+        
+        info = manager.get_file_info('late.wav')
+        assert info is not None
+        assert info['duration'] == 1.0
+    
+    def test_deleted_file_dropped(self, manager, temp_dirs):
+        """Test files deleted after indexing are no longer found"""
+        audio_dir, _ = temp_dirs
+        
+        test_file = os.path.join(audio_dir, 'test.wav')
+        create_test_wav(test_file, duration=1)
+        manager.scan_and_initialize()
+        assert manager.get_file_info('test.wav') is not None
+        
+        os.remove(test_file)
+        assert manager.get_file_info('test.wav') is None
+    
+    def test_replaced_file_reindexed(self, manager, temp_dirs):
+        """Test a file replaced under the same name gets fresh info"""
+        audio_dir, _ = temp_dirs
+        
+        test_file = os.path.join(audio_dir, 'test.wav')
+        create_test_wav(test_file, duration=1)
+        manager.scan_and_initialize()
+        assert manager.get_file_info('test.wav')['duration'] == 1.0
+        
+        replacement = os.path.join(audio_dir, 'replacement.tmp')
+        create_test_wav(replacement, duration=2)
+        os.replace(replacement, test_file)
+        
+        info = manager.get_file_info('test.wav')
+        assert info['duration'] == 2.0
+        assert info['size'] == os.path.getsize(test_file)
+    
+    def test_unknown_file(self, manager):
+        """Test missing or out-of-directory files are not found"""
+        assert manager.get_file_info('missing.wav') is None
+        assert manager.get_file_info('../test.wav') is None
+
+
 class TestPlayCountManagement:
     """Test play count tracking"""
     
@@ -117,6 +228,22 @@ class TestPlayCountManagement:
         metadata = manager.get_track_metadata('test.wav')
         assert metadata['segment_play_counts'][0] == 3
     
+    def test_play_counts_shared_between_managers(self, manager, temp_dirs):
+        """Test increments are visible to other managers (worker processes)"""
+        audio_dir, metadata_dir = temp_dirs
+        
+        test_file = os.path.join(audio_dir, 'test.wav')
+        create_test_wav(test_file, duration=2)
+        manager.scan_and_initialize()
+        
+        other = MetadataManager(audio_dir, metadata_dir, segment_duration=0.5)
+        assert other.get_overall_degradation('test.wav') == 0.0
+        
+        manager.increment_segment_play_count('test.wav', 2, 4)
+        
+        assert other.get_track_metadata('test.wav')['segment_play_counts'] == [0, 0, 4, 0]
+        assert other.get_overall_degradation('test.wav') == 1.0
+    
     def test_increment_total_streams(self, manager, temp_dirs):
         """Test incrementing total stream count"""
         audio_dir, _ = temp_dirs
@@ -131,6 +258,55 @@ class TestPlayCountManagement:
         
         metadata = manager.get_track_metadata('test.wav')
         assert metadata['total_streams'] == 2
+    
+    def test_metadata_lock_files_in_lock_dir(self, manager, temp_dirs):
+        """Test metadata lock files sit with the segment locks, not the data files"""
+        audio_dir, metadata_dir = temp_dirs
+        
+        create_test_wav(os.path.join(audio_dir, 'test.wav'), duration=1)
+        manager.scan_and_initialize()
+        manager.increment_total_streams('test.wav')
+        
+        assert os.path.exists(os.path.join(metadata_dir, 'locks', 'test.meta.lock'))
+        assert not any(name.endswith('.lock') for name in os.listdir(metadata_dir))
+    
+    def test_increment_total_streams_across_processes(self, manager, temp_dirs):
+        """Test concurrent workers don't lose stream count updates"""
+        audio_dir, metadata_dir = temp_dirs
+        
+        test_file = os.path.join(audio_dir, 'test.wav')
+        create_test_wav(test_file, duration=2)
+        manager.scan_and_initialize()
+        
+        # Forked processes, as gunicorn workers would be
+        pids = []
+        for _ in range(4):
+            pid = os.fork()
+            if pid == 0:
+                worker = MetadataManager(audio_dir, metadata_dir, segment_duration=0.5)
+                for _ in range(25):
+                    worker.increment_total_streams('test.wav')
+                os._exit(0)
+            pids.append(pid)
+        
+        for pid in pids:
+            os.waitpid(pid, 0)
+        
+        metadata = manager.get_track_metadata('test.wav')
+        assert metadata['total_streams'] == 100
+    
+    def test_increment_total_streams_corrupt_metadata(self, manager, temp_dirs):
+        """Test unreadable metadata skips the counter instead of raising"""
+        audio_dir, metadata_dir = temp_dirs
+        
+        test_file = os.path.join(audio_dir, 'test.wav')
+        create_test_wav(test_file, duration=2)
+        manager.scan_and_initialize()
+        
+        with open(os.path.join(metadata_dir, 'test.meta.mp'), 'wb') as f:
+            f.write(b'\xc1 not msgpack')
+        
+        manager.increment_total_streams('test.wav')
 
 
 class TestDegradationCalculation:
@@ -163,6 +339,22 @@ class TestDegradationCalculation:
         degradation = manager.get_overall_degradation('test.wav')
         assert degradation == 0.5
     
+    def test_degradation_updates_after_play(self, manager, temp_dirs):
+        """Test degradation reflects plays recorded after an earlier read"""
+        audio_dir, _ = temp_dirs
+        
+        test_file = os.path.join(audio_dir, 'test.wav')
+        create_test_wav(test_file, duration=2)
+        manager.scan_and_initialize()
+        
+        assert manager.get_overall_degradation('test.wav') == 0.0
+        
+        manager.increment_segment_play_count('test.wav', 0)
+        
+        # Average: (1 + 0 + 0 + 0) / 4 = 0.25
+        assert manager.get_overall_degradation('test.wav') == 0.25
+        assert manager.get_overall_degradation('test.wav', 2.0) == 0.5
+    
     def test_full_degradation(self, manager, temp_dirs):
         """Test 100% degradation (capped)"""
         audio_dir, _ = temp_dirs
@@ -209,3 +401,15 @@ class TestTrackListing:
         
         tracks = manager.get_all_tracks()
         assert 'overall_degradation' in tracks[0]
+    
+    def test_tracks_use_degradation_rate(self, manager, temp_dirs):
+        """Test track listing applies the given degradation rate"""
+        audio_dir, _ = temp_dirs
+        
+        test_file = os.path.join(audio_dir, 'test.wav')
+        create_test_wav(test_file, duration=2)
+        manager.scan_and_initialize()
+        manager.increment_segment_play_count('test.wav', 0)
+        
+        tracks = manager.get_all_tracks(2.0)
+        assert tracks[0]['overall_degradation'] == 0.5
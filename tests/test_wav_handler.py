@@ -0,0 +1,136 @@
+"""
+Tests for WAV file handling
+"""
+
+import pytest
+import numpy as np
+import os
+import struct
+import tempfile
+import shutil
+import wave
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
+
+import wav_handler
+from create_test_audio import create_test_wav
+
+
+@pytest.fixture
+def temp_dir():
+    """Create temporary directory"""
+    temp_dir = tempfile.mkdtemp()
+    yield temp_dir
+    shutil.rmtree(temp_dir)
+
+
+def insert_list_chunk(file_path):
+    """Insert a LIST chunk between fmt and data, as many DAWs do"""
+    with open(file_path, 'rb') as f:
+        content = f.read()
+    
+    list_chunk = b'LIST' + struct.pack('<I', 5) + b'INFO\x00' + b'\x00'  # odd size + pad byte
+    content = content[:36] + list_chunk + content[36:]
+    content = content[:4] + struct.pack('<I', len(content) - 8) + content[8:]
+    
+    with open(file_path, 'wb') as f:
+        f.write(content)
+
+
+class TestWavInfo:
+    """Test WAV header parsing"""
+    
+    def test_matches_wave_module(self, temp_dir):
+        """Test parsed parameters match the stdlib wave module"""
+        file_path = os.path.join(temp_dir, 'test.wav')
+        create_test_wav(file_path, duration=2)
+        
+        info = wav_handler.get_wav_info(file_path)
+        
+        with wave.open(file_path, 'rb') as wav_file:
+            assert info['sample_rate'] == wav_file.getframerate()
+            assert info['channels'] == wav_file.getnchannels()
+            assert info['sample_width'] == wav_file.getsampwidth()
+            assert info['num_frames'] == wav_file.getnframes()
+        
+        assert info['duration'] == 2.0
+        assert info['data_offset'] == 44
+    
+    def test_extra_chunk_before_data(self, temp_dir):
+        """Test data offset is found past non-audio chunks"""
+        file_path = os.path.join(temp_dir, 'test.wav')
+        create_test_wav(file_path, duration=1)
+        insert_list_chunk(file_path)
+        
+        info = wav_handler.get_wav_info(file_path)
+        assert info['data_offset'] == 44 + 14
+        assert info['num_frames'] == 44100
+    
+    def test_not_a_wav_file(self, temp_dir):
+        """Test non-RIFF files are rejected"""
+        file_path = os.path.join(temp_dir, 'test.wav')
+        with open(file_path, 'wb') as f:
+            f.write(b'\x00' * 64)
+        
+        with pytest.raises(ValueError):
+            wav_handler.get_wav_info(file_path)
+    
+    def test_truncated_header(self, temp_dir):
+        """Test files too short for a RIFF header are rejected"""
+        file_path = os.path.join(temp_dir, 'test.wav')
+        with open(file_path, 'wb') as f:
+            f.write(b'RIFF')
+        
+        with pytest.raises(ValueError):
+            wav_handler.get_wav_info(file_path)
+    
+    def test_truncated_fmt_chunk(self, temp_dir):
+        """Test fmt chunks shorter than 16 bytes are rejected"""
+        file_path = os.path.join(temp_dir, 'test.wav')
+        with open(file_path, 'wb') as f:
+            f.write(b'RIFF' + struct.pack('<I', 24) + b'WAVE')
+            f.write(b'fmt ' + struct.pack('<I', 8) + b'\x01\x00\x02\x00\x44\xac\x00\x00')
+            f.write(b'data' + struct.pack('<I', 0))
+        
+        with pytest.raises(ValueError):
+            wav_handler.get_wav_info(file_path)
+
+
+class TestSegmentIO:
+    """Test segment reads and writes"""
+    
+    def test_read_segment(self, temp_dir):
+        """Test segment samples match the wave module's frames"""
+        file_path = os.path.join(temp_dir, 'test.wav')
+        create_test_wav(file_path, duration=2)
+        
+        audio_data, _ = wav_handler.read_segment(file_path, 1, 0.5)
+        
+        with wave.open(file_path, 'rb') as wav_file:
+            wav_file.setpos(22050)
+            expected = np.frombuffer(wav_file.readframes(22050), dtype=np.int16).reshape(-1, 2)
+        
+        assert audio_data.shape == (22050, 2)
+        assert np.array_equal(audio_data, expected)
+    
+    def test_read_last_partial_segment(self, temp_dir):
+        """Test the final segment is clamped to the end of the data"""
+        file_path = os.path.join(temp_dir, 'test.wav')
+        create_test_wav(file_path, duration=1.2)
+        
+        audio_data, _ = wav_handler.read_segment(file_path, 2, 0.5)
+        assert audio_data.shape == (int(44100 * 1.2) - 44100, 2)
+    
+    def test_write_segment_with_extra_chunk(self, temp_dir):
+        """Test writes land on the right samples when data isn't at byte 44"""
+        file_path = os.path.join(temp_dir, 'test.wav')
+        create_test_wav(file_path, duration=1)
+        insert_list_chunk(file_path)
+        
+        wav_handler.write_segment(file_path, 1, 0.5, np.zeros((22050, 2), dtype=np.int16))
+        
+        first, _ = wav_handler.read_segment(file_path, 0, 0.5)
+        second, _ = wav_handler.read_segment(file_path, 1, 0.5)
+        assert first.any()
+        assert not second.any()
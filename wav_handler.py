@@ -3,39 +3,102 @@ WAV File Handler
 Handles reading and writing audio segments from WAV files.
 """
 
-import wave
+import math
+import os
+import struct
 import numpy as np
-from typing import Dict, Tuple
+from typing import Dict, Optional, Tuple
+
+# NumPy sample type for each supported sample width in bytes
+DTYPE_FOR_WIDTH = {
+    2: np.int16,  # 16-bit audio
+    4: np.int32,  # 32-bit audio
+}
+
+# WAVE_FORMAT_PCM and WAVE_FORMAT_EXTENSIBLE (integer PCM written by most tools)
+PCM_FORMATS = (0x0001, 0xFFFE)
 
 
 def get_wav_info(file_path: str) -> Dict[str, any]:
     """
-    Extract WAV file parameters.
+    Extract WAV file parameters by parsing the RIFF chunk headers.
     
     Args:
         file_path: Path to WAV file
         
     Returns:
-        Dictionary with sample_rate, channels, sample_width, num_frames, duration
+        Dictionary with sample_rate, channels, sample_width, num_frames, duration,
+        data_offset (byte position of the first sample) and data_size
+        
+    Raises:
+        ValueError: If the file is not a PCM WAV file
     """
-    with wave.open(file_path, 'rb') as wav_file:
-        params = wav_file.getparams()
-        sample_rate = params.framerate
-        channels = params.nchannels
-        sample_width = params.sampwidth
-        num_frames = params.nframes
-        duration = num_frames / sample_rate
+    with open(file_path, 'rb') as f:
+        riff_header = f.read(12)
+        if len(riff_header) < 12:
+            raise ValueError(f"Truncated WAV header: {file_path}")
+        
+        riff, _, wave_id = struct.unpack('<4sI4s', riff_header)
+        if riff != b'RIFF' or wave_id != b'WAVE':
+            raise ValueError(f"Not a RIFF/WAVE file: {file_path}")
+        
+        fmt = None
         
-        return {
-            'sample_rate': sample_rate,
-            'channels': channels,
-            'sample_width': sample_width,
-            'num_frames': num_frames,
-            'duration': duration
-        }
+        # Walk the chunk list; fmt and data are not always at fixed offsets
+        # (e.g. LIST/INFO chunks written by DAWs push data past byte 44)
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                raise ValueError(f"No data chunk in WAV file: {file_path}")
+            
+            chunk_id, chunk_size = struct.unpack('<4sI', chunk_header)
+            
+            if chunk_id == b'fmt ':
+                fmt_data = f.read(16)
+                if chunk_size < 16 or len(fmt_data) < 16:
+                    raise ValueError(f"Truncated fmt chunk in WAV file: {file_path}")
+                fmt = struct.unpack('<HHIIHH', fmt_data)
+                f.seek(chunk_size - 16 + (chunk_size & 1), os.SEEK_CUR)
+            elif chunk_id == b'data':
+                data_offset = f.tell()
+                break
+            else:
+                # Chunks are padded to an even number of bytes
+                f.seek(chunk_size + (chunk_size & 1), os.SEEK_CUR)
+        
+        file_size = os.fstat(f.fileno()).st_size
+    
+    if fmt is None:
+        raise ValueError(f"No fmt chunk before data in WAV file: {file_path}")
+    
+    audio_format, channels, sample_rate, _, _, bits_per_sample = fmt
+    if audio_format not in PCM_FORMATS:
+        raise ValueError(f"Unsupported WAV format {audio_format:#06x}: {file_path}")
+    
+    sample_width = (bits_per_sample + 7) // 8
+    
+    # Truncated files can declare more data than they hold
+    data_size = min(chunk_size, file_size - data_offset)
+    num_frames = data_size // (channels * sample_width)
+    duration = num_frames / sample_rate
+    
+    return {
+        'sample_rate': sample_rate,
+        'channels': channels,
+        'sample_width': sample_width,
+        'num_frames': num_frames,
+        'duration': duration,
+        'data_offset': data_offset,
+        'data_size': data_size
+    }
 
 
-def read_segment(file_path: str, segment_index: int, segment_duration: float) -> Tuple[np.ndarray, Dict[str, any]]:
+def read_segment(
+    file_path: str,
+    segment_index: int,
+    segment_duration: float,
+    wav_info: Optional[Dict[str, any]] = None
+) -> Tuple[np.ndarray, Dict[str, any]]:
     """
     Read audio samples for a specific segment.
     
@@ -43,11 +106,13 @@ def read_segment(file_path: str, segment_index: int, segment_duration: float) ->
         file_path: Path to WAV file
         segment_index: Index of segment to read (0-based)
         segment_duration: Duration of each segment in seconds
+        wav_info: Previously read get_wav_info result (re-read from file if omitted)
         
     Returns:
         Tuple of (audio_data as NumPy array, wav_info dict)
     """
-    wav_info = get_wav_info(file_path)
+    if wav_info is None:
+        wav_info = get_wav_info(file_path)
     
     sample_rate = wav_info['sample_rate']
     channels = wav_info['channels']
@@ -59,21 +124,20 @@ def read_segment(file_path: str, segment_index: int, segment_duration: float) ->
     # Calculate start frame for this segment
     start_frame = segment_index * samples_per_segment
     
-    # Open WAV file and seek to segment position
-    with wave.open(file_path, 'rb') as wav_file:
-        wav_file.setpos(start_frame)
-        
-        # Read frames for this segment
-        frames = wav_file.readframes(samples_per_segment)
-        
-    # Convert bytes to NumPy array
-    if sample_width == 2:  # 16-bit audio
-        dtype = np.int16
-    elif sample_width == 4:  # 32-bit audio
-        dtype = np.int32
-    else:
-        dtype = np.int16  # Default to 16-bit
+    # Clamp to the end of the data chunk (last segment is usually short)
+    bytes_per_frame = sample_width * channels
+    num_frames = max(0, min(samples_per_segment, wav_info['num_frames'] - start_frame))
+    byte_offset = wav_info['data_offset'] + start_frame * bytes_per_frame
+    
+    # Read the segment's bytes directly at their offset
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        frames = os.pread(fd, num_frames * bytes_per_frame, byte_offset)
+    finally:
+        os.close(fd)
     
+    # Convert bytes to NumPy array (default to 16-bit for unknown widths)
+    dtype = DTYPE_FOR_WIDTH.get(sample_width, np.int16)
     audio_data = np.frombuffer(frames, dtype=dtype)
     
     # Reshape to (samples, channels) if stereo
@@ -83,7 +147,13 @@ def read_segment(file_path: str, segment_index: int, segment_duration: float) ->
     return audio_data, wav_info
 
 
-def write_segment(file_path: str, segment_index: int, segment_duration: float, audio_data: np.ndarray):
+def write_segment(
+    file_path: str,
+    segment_index: int,
+    segment_duration: float,
+    audio_data: np.ndarray,
+    wav_info: Optional[Dict[str, any]] = None
+):
     """
     Write audio samples to a specific segment position in WAV file.
     
@@ -92,8 +162,10 @@ def write_segment(file_path: str, segment_index: int, segment_duration: float, a
         segment_index: Index of segment to write (0-based)
         segment_duration: Duration of each segment in seconds
         audio_data: NumPy array of audio samples to write
+        wav_info: Previously read get_wav_info result (re-read from file if omitted)
     """
-    wav_info = get_wav_info(file_path)
+    if wav_info is None:
+        wav_info = get_wav_info(file_path)
     
     sample_rate = wav_info['sample_rate']
     sample_width = wav_info['sample_width']
@@ -104,10 +176,9 @@ def write_segment(file_path: str, segment_index: int, segment_duration: float, a
     # Calculate start frame for this segment
     start_frame = segment_index * samples_per_segment
     
-    # Calculate byte offset (WAV header is 44 bytes)
-    header_size = 44
-    bytes_per_sample = sample_width * wav_info['channels']
-    byte_offset = header_size + (start_frame * bytes_per_sample)
+    # Calculate byte offset from the start of the data chunk
+    bytes_per_frame = sample_width * wav_info['channels']
+    byte_offset = wav_info['data_offset'] + (start_frame * bytes_per_frame)
     
     # Flatten audio data if multi-channel
     if audio_data.ndim > 1:
@@ -122,17 +193,23 @@ def write_segment(file_path: str, segment_index: int, segment_duration: float, a
         f.write(audio_bytes)
 
 
-def calculate_total_segments(file_path: str, segment_duration: float) -> int:
+def calculate_total_segments(
+    file_path: str,
+    segment_duration: float,
+    wav_info: Optional[Dict[str, any]] = None
+) -> int:
     """
     Calculate total number of segments in a WAV file.
     
     Args:
         file_path: Path to WAV file
         segment_duration: Duration of each segment in seconds
+        wav_info: Previously read get_wav_info result (re-read from file if omitted)
         
     Returns:
         Total number of segments
     """
-    wav_info = get_wav_info(file_path)
+    if wav_info is None:
+        wav_info = get_wav_info(file_path)
     duration = wav_info['duration']
-    return int(np.ceil(duration / segment_duration))
+    return math.ceil(duration / segment_duration)